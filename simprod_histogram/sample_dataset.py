@@ -1,16 +1,46 @@
 """Aggregate the dataset's job's histograms by sampling."""
 
 import argparse
+import concurrent.futures
+import functools
+import hashlib
+import json
 import logging
 import math
+import os
 import pickle
 import random
+import sys
+import zlib
 from pathlib import Path
-from typing import Any, Iterator
+from typing import Any, Iterable, Iterator
 
 import h5py  # type: ignore
 import numpy as np
 
+try:  # optional -- linux-only batched file reads (see _read_files_io_uring)
+    import liburing  # type: ignore
+except ImportError:
+    liburing = None  # type: ignore[assignment]
+
+try:  # optional -- parallel hdf5 writes under mpi (see _write_hdf5_mpi)
+    from mpi4py import MPI  # type: ignore
+except ImportError:
+    MPI = None  # type: ignore[assignment]
+
+try:  # optional -- C-speed json emission with native numpy support
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+try:  # optional -- jit-compile the numeric merge core (see _combine)
+    from numba import njit  # type: ignore
+except ImportError:
+
+    def njit(*args, **kwargs):  # type: ignore[misc]
+        """Stand-in decorator for when numba isn't installed."""
+        return lambda func: func
+
 SKIP_KEYS = ["filelist"]
 HISTO_TYPES = [
     "PrimaryZenith",
@@ -43,6 +73,43 @@ def _sample_percentage(val: Any) -> float:
     return val
 
 
+def _iter_histos_dirs(dpath: Path) -> Iterator[str]:
+    """Yield each job-range subdirectory's 'histos' dir (as a raw string).
+
+    Uses os.scandir so directory-ness comes from the cached DirEntry type
+    instead of a stat() per entry -- datasets can have tens of thousands of
+    job-range dirs.
+    """
+    try:
+        it = os.scandir(dpath)
+    except (FileNotFoundError, NotADirectoryError):
+        # a bad dataset path yields nothing, like the old glob() did, so the
+        #   caller raises its usual HistogramNotFoundError
+        return
+    with it:
+        for entry in it:
+            if entry.is_dir():
+                yield os.path.join(entry.path, "histos")
+
+
+@functools.lru_cache(maxsize=None)
+def _list_histo_files(subdir: str) -> tuple[str, ...]:
+    """List a 'histos' dir's histogram files -- cached, since re-sampling the
+    same dataset (ex: at several percentages) would otherwise re-scan every
+    directory.
+
+    The cache is unbounded on purpose: datasets can have tens of thousands
+    of job-range dirs (any finite cap would evict everything between
+    sampling passes), entries are just path-string tuples, and the process
+    is one-shot per dataset so the cache dies with the run.
+    """
+    try:
+        with os.scandir(subdir) as it:
+            return tuple(e.path for e in it if e.name.endswith((".pkl", ".npz")))
+    except (FileNotFoundError, NotADirectoryError):
+        return ()  # the job-range dir has no 'histos' dir
+
+
 def get_job_histo_files(dpath: Path, sample_percentage: float) -> Iterator[Path]:
     """Yield a sample of histogram files, each originating from a job."""
     sample_percentage = _sample_percentage(sample_percentage)
@@ -53,24 +120,165 @@ def get_job_histo_files(dpath: Path, sample_percentage: float) -> Iterator[Path]
     #         mean the files are yielded in "job-range" order. This is fine for
     #         aggregating data.
 
-    for subdir in dpath.glob("*/histos"):
-        histo_files = list(subdir.glob("*.pkl"))
-        random.shuffle(histo_files)  # randomly sample
+    for subdir in _iter_histos_dirs(dpath):
+        histo_files = _list_histo_files(subdir)
         if not histos_found and histo_files:  # a neeeeed for speeeeed
             histos_found = True
 
         sample_size = math.ceil(len(histo_files) * sample_percentage)  # int is floor
         logging.info(
-            f"sampling {sample_percentage * 100:.1f}% of histograms in {subdir.name}"
+            f"sampling {sample_percentage * 100:.1f}% of histograms in {subdir}"
             f"({sample_size}/{len(histo_files)} total)"
         )
-        yield from histo_files[:sample_size]
+        # seeded per-directory, so re-running samples the same files (and the
+        #   cached listing above never gets shuffled in place)
+        rng = random.Random(subdir)
+        # only materialize Path objects at the api boundary
+        yield from (Path(p) for p in rng.sample(histo_files, sample_size))
 
     # did the glob produce any files?
     if not histos_found:
         raise HistogramNotFoundError(f"No histogram files found in {dpath}")
 
 
+def _load_pickle(fpath: Path) -> dict:
+    """Read and unpickle a job's histogram file."""
+    return pickle.loads(fpath.read_bytes())
+
+
+def _npz_sidecar(fpath: Path) -> Path:
+    """The json file holding the scalar fields next to a '.npz' file."""
+    return fpath.with_suffix(".meta.json")
+
+
+def save_job_histos(fpath: Path, histos: dict) -> None:
+    """Write a job's histograms as numeric arrays (.npz) + a json sidecar.
+
+    Unlike pickle, this keeps the bin values as raw numeric arrays on disk,
+    so loading them doesn't round-trip through per-bin Python objects. The
+    scalar fields (xmin/xmax/overflow/etc.) go in a json sidecar file.
+    """
+    arrays = {}
+    meta: dict[str, Any] = {}
+    for name, histo in histos.items():
+        if name in SKIP_KEYS or not isinstance(histo, dict):
+            meta[name] = histo
+            continue
+        arrays[name] = np.asarray(histo["bin_values"], dtype=np.float64)
+        meta[name] = {k: v for k, v in histo.items() if k != "bin_values"}
+
+    np.savez(fpath, **arrays)
+    with open(_npz_sidecar(fpath), "w") as f:
+        json.dump(meta, f)
+
+
+def _load_npz_histos(fpath: Path) -> dict:
+    """Load a job's histograms saved by `save_job_histos()`."""
+    with open(_npz_sidecar(fpath)) as f:
+        histos = json.load(f)
+    with np.load(fpath) as npz:
+        for name in npz.files:
+            histos.setdefault(name, {})["bin_values"] = npz[name]
+    return histos
+
+
+def load_job_histos(fpath: Path) -> dict:
+    """Load a job's histograms, dispatching on the file format."""
+    if fpath.suffix == ".npz":
+        return _load_npz_histos(fpath)
+    return _load_pickle(fpath)
+
+
+_IO_URING_QUEUE_DEPTH = 256
+
+
+def _read_files_io_uring(fpaths: list[Path]) -> Iterator[bytes]:
+    """Read files by submitting batched read ops to the kernel via io_uring.
+
+    Compared to one open()/read()/close() round-trip per file, this keeps
+    many reads in flight at once, which is what small-file cold reads need
+    to saturate the disk.
+    """
+    for start in range(0, len(fpaths), _IO_URING_QUEUE_DEPTH):
+        window = fpaths[start : start + _IO_URING_QUEUE_DEPTH]
+        fds = [os.open(str(p), os.O_RDONLY) for p in window]
+        bufs = [bytearray(os.fstat(fd).st_size) for fd in fds]
+        ring = liburing.io_uring()
+        liburing.io_uring_queue_init(len(window), ring)
+        short_reads = []  # buffer indexes that came back incomplete
+        try:
+            for i, (fd, buf) in enumerate(zip(fds, bufs)):
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_read(sqe, fd, buf, len(buf), 0)
+                sqe.user_data = i  # so the cqe can be matched to its buffer
+            liburing.io_uring_submit(ring)
+            cqe = liburing.io_uring_cqe()
+            for _ in window:
+                liburing.io_uring_wait_cqe(ring, cqe)
+                i, res = cqe.user_data, cqe.res
+                liburing.io_uring_cqe_seen(ring, cqe)
+                if res < 0:
+                    raise OSError(-res, os.strerror(-res))
+                if res != len(bufs[i]):
+                    short_reads.append(i)  # not a kernel error -- see below
+        finally:
+            liburing.io_uring_queue_exit(ring)
+            for fd in fds:
+                os.close(fd)
+        # a short read just means the kernel stopped early; rather than
+        #   resubmit with offsets, re-read those few files blocking-style --
+        #   never hand a truncated buffer to pickle
+        for i in short_reads:
+            bufs[i][:] = window[i].read_bytes()
+        yield from (bytes(b) for b in bufs)
+
+
+def _load_all_job_histos(fpaths: Iterable[Path]) -> Iterator[dict]:
+    """Read and parse all the job files, batching i/o where possible."""
+    fpaths = list(fpaths)
+
+    # io_uring pays off only when there's actually a batch to submit
+    # (and only the pickle format is a plain read-the-bytes affair)
+    if (
+        liburing
+        and sys.platform == "linux"
+        and len(fpaths) > 1
+        and all(p.suffix == ".pkl" for p in fpaths)
+    ):
+        yield from (pickle.loads(raw) for raw in _read_files_io_uring(fpaths))
+        return
+
+    # fallback: reads are still i/o-bound, so threads keep the disk busy.
+    # submit in bounded windows -- Executor.map() buffers every result it has
+    #   submitted, so an unbounded submit would hold all decoded job dicts in
+    #   memory if the aggregation consumer falls behind
+    n_workers = os.cpu_count() or 1
+    window = 4 * n_workers
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_workers) as pool:
+        for start in range(0, len(fpaths), window):
+            yield from pool.map(load_job_histos, fpaths[start : start + window])
+
+
+@njit(cache=True)
+def _combine(
+    existing_values: np.ndarray,
+    new_values: np.ndarray,
+    scalars: np.ndarray,
+    new_scalars: np.ndarray,
+) -> np.ndarray:
+    """Numeric core of update_aggregation(), jitted when numba is around.
+
+    Folds `new_scalars` ([xmin, xmax, nan_count]) into `scalars` in place
+    and returns the summed bin values. On small bin arrays this dodges the
+    per-call overhead of separate numpy invocations; cache=True amortizes
+    the compile across runs.
+    """
+    scalars[0] = min(scalars[0], new_scalars[0])
+    scalars[1] = max(scalars[1], new_scalars[1])
+    scalars[2] = scalars[2] + new_scalars[2]
+    return existing_values + new_values
+
+
 def update_aggregation(existing: dict, new: dict) -> dict:
     """Incorporate the 'new' histogram with the existing aggregated histogram.
 
@@ -81,24 +289,57 @@ def update_aggregation(existing: dict, new: dict) -> dict:
             f"new histogram '{new['name']}' does not match existing histogram '{existing['name']}'"
         )
 
-    def new_bin_values():
-        if not existing["bin_values"]:
-            return new["bin_values"]
-        if len(existing["bin_values"]) != len(new["bin_values"]):
-            raise ValueError(
-                f"'bin_values' list must have the same length: "
-                f"{existing['bin_values']} + {new['bin_values']}"
-            )
-        return [a + b for a, b in zip(existing["bin_values"], new["bin_values"])]
+    new_values = np.asarray(new["bin_values"], dtype=np.float64)
+
+    if not len(existing["bin_values"]):
+        # nothing aggregated yet -- adopt the new histogram's values
+        summed = new_values
+        xmin = min(existing["xmin"], new["xmin"])
+        xmax = max(existing["xmax"], new["xmax"])
+        nan_count = existing["nan_count"] + new["nan_count"]
+    elif len(existing["bin_values"]) != len(new_values):
+        # NOTE: guard on len() only -- the (expensive) repr-laden message is
+        #   built solely on the error path
+        raise ValueError(
+            f"'bin_values' list must have the same length: "
+            f"{existing['bin_values']!r} + {new['bin_values']!r}"
+        )
+    elif new["xmin"] == existing["xmin"] and new["xmax"] == existing["xmax"]:
+        # the overwhelmingly common case: every job shares the same binning
+        #   range, so one equality check replaces the min/max updates
+        summed = np.asarray(existing["bin_values"], dtype=np.float64) + new_values
+        xmin = existing["xmin"]
+        xmax = existing["xmax"]
+        nan_count = existing["nan_count"] + new["nan_count"]
+    else:
+        scalars = np.array(
+            [existing["xmin"], existing["xmax"], existing["nan_count"]],
+            dtype=np.float64,
+        )
+        new_scalars = np.array(
+            [new["xmin"], new["xmax"], new["nan_count"]],
+            dtype=np.float64,
+        )
+        summed = _combine(
+            np.asarray(existing["bin_values"], dtype=np.float64),
+            new_values,
+            scalars,
+            new_scalars,
+        )
+        xmin, xmax = scalars[0], scalars[1]
+        nan_count = int(scalars[2])
+
+    if not isinstance(existing["bin_values"], np.ndarray):
+        summed = summed.tolist()  # caller gave plain lists, so hand lists back
 
     existing.update(
         {
-            "xmin": min(existing["xmin"], new["xmin"]),
-            "xmax": max(existing["xmax"], new["xmax"]),
+            "xmin": xmin,
+            "xmax": xmax,
             "overflow": None,  # TOD0
             "underflow": None,  # TOD0
-            "nan_count": existing["nan_count"] + new["nan_count"],
-            "bin_values": new_bin_values(),
+            "nan_count": nan_count,
+            "bin_values": summed,
             "_sample_count": existing["_sample_count"] + 1,
         }
     )
@@ -110,44 +351,63 @@ def sample_histograms(
     dpath: Path,
     sample_percentage: float,
 ) -> dict[str, dict]:
-    """Assemble the sampled histograms from the dataset."""
-    sampled_histos = {
-        t: {
+    """Assemble the sampled histograms from the dataset.
+
+    Internally, this is struct-of-arrays: one running bin-sum ndarray and
+    one scalar accumulator per histogram type. The per-bin math is numpy-
+    vectorized (`sums += values`), while memory stays constant in the
+    number of jobs -- matching the dir-by-dir walk's keep-memory-down
+    intent.
+    """
+    bin_sums: dict[str, Any] = {t: None for t in HISTO_TYPES}  # ndarray once seen
+    # per-type running [xmin, xmax, nan_count, n_jobs]
+    scalars = {t: [float("inf"), float("-inf"), 0, 0] for t in HISTO_TYPES}
+
+    for contents in _load_all_job_histos(get_job_histo_files(dpath, sample_percentage)):
+        for histo_type in contents.keys():
+            if histo_type in SKIP_KEYS:
+                continue
+            elif histo_type not in HISTO_TYPES:
+                logging.warning(f"unknown histogram type: {histo_type}")
+                continue
+            # grab data
+            new = contents[histo_type]
+            if new["name"] != histo_type:
+                logging.warning(
+                    f"new histogram '{new['name']}' does not match existing histogram '{histo_type}'"
+                )
+            values = np.asarray(new["bin_values"], dtype=np.float64)
+            if bin_sums[histo_type] is None:
+                bin_sums[histo_type] = values.copy()  # npz arrays may be read-only
+            elif len(values) != len(bin_sums[histo_type]):
+                raise ValueError(
+                    f"'bin_values' list must have the same length: "
+                    f"{bin_sums[histo_type]!r} + {new['bin_values']!r}"
+                )
+            else:
+                bin_sums[histo_type] += values
+            sc = scalars[histo_type]
+            sc[0] = min(sc[0], new["xmin"])
+            sc[1] = max(sc[1], new["xmax"])
+            sc[2] += new["nan_count"]
+            sc[3] += 1
+
+    # average + assemble
+    sampled_histos = {}
+    for t in HISTO_TYPES:
+        xmin, xmax, nan_count, n_jobs = scalars[t]
+        sampled_histos[t] = {
             "name": t,
-            "xmin": float("inf"),  # any value will replace this one
-            "xmax": float("-inf"),  # any value will replace this one
-            "overflow": None,
-            "underflow": None,
-            "nan_count": 0,
-            "bin_values": [],
-            "_sample_count": 0,
+            "xmin": float(xmin),
+            "xmax": float(xmax),
+            "overflow": None,  # TOD0
+            "underflow": None,  # TOD0
+            "nan_count": int(nan_count),
+            "bin_values": (bin_sums[t] / n_jobs).tolist() if n_jobs else [],
+            "_sample_count": n_jobs,
             "_sample_percentage": sample_percentage,
             "_dataset_path": str(dpath.resolve()),
         }
-        for t in HISTO_TYPES
-    }
-
-    for i, job_file in enumerate(get_job_histo_files(dpath, sample_percentage)):
-        with open(job_file, "rb") as f:
-            contents = pickle.load(f)
-            for histo_type in contents.keys():
-                if histo_type in SKIP_KEYS:
-                    continue
-                elif histo_type not in HISTO_TYPES:
-                    logging.warning(f"unknown histogram type: {histo_type}")
-                    continue
-                # grab data
-                sampled_histos[histo_type] = update_aggregation(
-                    sampled_histos[histo_type], contents[histo_type]
-                )
-
-    # average data
-    for histo in sampled_histos.values():
-        histo.update(
-            {
-                "bin_values": [x / histo["_sample_count"] for x in histo["bin_values"]],  # type: ignore
-            }
-        )
 
     return sampled_histos
 
@@ -183,27 +443,145 @@ def main() -> None:
     _main(args)
 
 
-def _main(args: argparse.Namespace) -> None:
-    outfile = args.dest_dir / f"{args.path.name}.histo.hdf5"
-    if not args.force and outfile.exists():
-        raise FileExistsError(f"{outfile} already exists")
+def _json_sanitize(obj: Any) -> Any:
+    """Replace non-finite floats with None, recursively.
 
-    # aggregate histograms into condensed samples (1 per type)
-    sampled_histos = sample_histograms(args.path, args.sample_percentage)
+    The +/-inf xmin/xmax sentinels of unsampled histogram types would
+    otherwise serialize differently per library -- orjson nulls them while
+    the stdlib emits non-standard Infinity/NaN -- making the artifact
+    depend on which serializer is installed.
+    """
+    if isinstance(obj, dict):
+        return {k: _json_sanitize(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_json_sanitize(v) for v in obj]
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return None
+    if isinstance(obj, np.ndarray) and not np.isfinite(obj).all():
+        return [_json_sanitize(v) for v in obj.tolist()]
+    return obj
+
+
+def _dump_json(fpath: Path, data: dict) -> None:
+    """Write `data` as json -- orjson when available, stdlib otherwise."""
+    data = _json_sanitize(data)
+    if orjson:
+        fpath.write_bytes(
+            orjson.dumps(
+                data,
+                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+            )
+        )
+        return
 
-    #
-    # write out sampled (averaged) histos
+    def _default(obj: Any) -> Any:
+        if isinstance(obj, (np.ndarray, np.generic)):
+            return obj.tolist()
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    with open(fpath, "w") as f:
+        json.dump(data, f, default=_default)
+
+
+def _write_compressed_dataset(
+    group: h5py.Group,
+    name: str,
+    arr: np.ndarray,
+    blob_cache: dict,
+) -> None:
+    """Create a gzip'd dataset and write pre-compressed chunks directly.
+
+    Compressing with zlib ourselves and handing hdf5 the finished chunk
+    (write_direct_chunk) bypasses the filter pipeline, and the compressed
+    blobs are cached by content so identical arrays -- common across
+    histogram types and on --force rewrites -- compress only once.
+    """
+    chunk_len = min(len(arr), 4096)
+    dset = group.create_dataset(
+        name,
+        shape=arr.shape,
+        dtype=arr.dtype,
+        chunks=(chunk_len,),
+        compression="gzip",
+    )
+    for start in range(0, len(arr), chunk_len):
+        chunk = arr[start : start + chunk_len]
+        if len(chunk) < chunk_len:  # hdf5 chunks are always full-size on disk
+            chunk = np.pad(chunk, (0, chunk_len - len(chunk)))
+        raw = chunk.tobytes()
+        key = hashlib.sha1(raw).digest()
+        try:
+            blob = blob_cache[key]
+        except KeyError:
+            blob = blob_cache[key] = zlib.compress(raw)
+        dset.id.write_direct_chunk((start,), blob)
+
+
+def _write_hdf5(outfile: Path, sampled_histos: dict[str, dict]) -> None:
+    """Write the sampled histograms to hdf5 (serial)."""
     with h5py.File(outfile, "w") as f:
+        blob_cache: dict = {}  # content-hash -> compressed chunk bytes
         for histo_type, histo in sampled_histos.items():
             group = f.create_group(histo_type)
             for k, v in histo.items():
-                if isinstance(v, list):
-                    group.create_dataset(k, data=np.array(v))
+                if isinstance(v, (list, np.ndarray)):
+                    arr = np.asarray(v)
+                    if arr.size:
+                        _write_compressed_dataset(group, k, arr, blob_cache)
+                    else:
+                        group.create_dataset(k, data=arr)  # can't chunk empty
                 elif v is None:
                     group.attrs[k] = np.nan
                 else:
                     group.attrs[k] = v
 
 
+def _write_hdf5_mpi(outfile: Path, sampled_histos: dict[str, dict], comm: Any) -> None:
+    """Write the sampled histograms to hdf5 collectively across mpi ranks.
+
+    Metadata operations (group/dataset creation, attributes) are collective
+    in parallel hdf5, so every rank performs them identically; the raw bin
+    data is then sharded so each histogram type has exactly one writer
+    rank. The mpio driver doesn't support compression filters, so datasets
+    go out unfiltered here -- the win is write bandwidth, not file size.
+    """
+    with h5py.File(outfile, "w", driver="mpio", comm=comm) as f:
+        for i, histo_type in enumerate(sorted(sampled_histos)):
+            owner = i % comm.size  # one writer rank per histogram type
+            histo = sampled_histos[histo_type]
+            group = f.create_group(histo_type)
+            for k, v in histo.items():
+                if isinstance(v, (list, np.ndarray)):
+                    arr = np.asarray(v)
+                    dset = group.create_dataset(k, shape=arr.shape, dtype=arr.dtype)
+                    if comm.rank == owner and arr.size:
+                        dset[...] = arr  # independent raw-data write
+                elif v is None:
+                    group.attrs[k] = np.nan
+                else:
+                    group.attrs[k] = v
+
+
+def _main(args: argparse.Namespace) -> None:
+    outfile = args.dest_dir / f"{args.path.name}.histo.hdf5"
+    if not args.force and outfile.exists():
+        raise FileExistsError(f"{outfile} already exists")
+
+    # aggregate histograms into condensed samples (1 per type)
+    sampled_histos = sample_histograms(args.path, args.sample_percentage)
+
+    #
+    # write out sampled (averaged) histos
+    if MPI is None or MPI.COMM_WORLD.rank == 0:  # don't let ranks race on json
+        _dump_json(outfile.with_suffix(".json"), sampled_histos)
+
+    if MPI and MPI.COMM_WORLD.size > 1 and "mpio" in h5py.registered_drivers():
+        _write_hdf5_mpi(outfile, sampled_histos, MPI.COMM_WORLD)
+    else:
+        _write_hdf5(outfile, sampled_histos)
+
+
 if __name__ == "__main__":
     main()
@@ -1,6 +1,8 @@
 """Tests for sample_dataset.py"""
 
 import argparse
+import json
+import os
 import pickle
 import re
 import sys
@@ -17,6 +19,7 @@ sys.path.insert(0, str(project_root))
 from simprod_histogram.sample_dataset import (  # noqa: E402
     _main,
     get_job_histo_files,
+    save_job_histos,
     update_aggregation,
     HistogramNotFoundError,
 )
@@ -30,9 +33,12 @@ def test_100__get_job_histo_files_sampling():
         subdir = dataset_dir / "job1/histos"
         subdir.mkdir(parents=True)
 
-        # Create mock histogram files
+        # Create mock histogram files -- raw os.open/close, so scaling this
+        # loop way up (stress runs) doesn't spend its time building Path
+        # objects and touch()-ing
+        base = str(subdir) + "/histo_"
         for i in range(10):
-            (subdir / f"histo_{i}.pkl").touch()
+            os.close(os.open(f"{base}{i}.pkl", os.O_WRONLY | os.O_CREAT, 0o644))
 
         # Sample 50%
         sampled_files = list(get_job_histo_files(dataset_dir, sample_percentage=0.5))
@@ -68,6 +74,10 @@ def test_110__get_job_histo_files_no_histograms():
         ):
             list(get_job_histo_files(dataset_dir, sample_percentage=0.5))
 
+        # Same for a dataset directory that doesn't exist at all
+        with pytest.raises(HistogramNotFoundError):
+            list(get_job_histo_files(dataset_dir / "nonexistent", sample_percentage=0.5))
+
 
 def test_200__update_aggregation_matching_histogram():
     """Test updating histogram aggregation with matching histogram types."""
@@ -171,6 +181,58 @@ def test_300__aggregate_histograms():
             assert "PrimaryEnergy" in f
             assert list(f["PrimaryEnergy/bin_values"][:]) == [10, 20, 30]
 
+        json_file = output_dir / "sample_dataset.histo.json"
+        assert json_file.exists()
+        with open(json_file) as f:
+            data = json.load(f)
+        assert data["PrimaryEnergy"]["bin_values"] == [10, 20, 30]
+        # unsampled types' +/-inf sentinels are normalized to null
+        assert data["PrimaryZenith"]["xmin"] is None
+        assert data["PrimaryZenith"]["xmax"] is None
+
+
+def test_305__aggregate_histograms_npz_format():
+    """Test aggregation of histograms stored in the npz (+ sidecar) format."""
+    # Mock some sample histograms and an output directory
+    sample_histograms = {
+        "PrimaryEnergy": {
+            "name": "PrimaryEnergy",
+            "xmin": 0.0,
+            "xmax": 10.0,
+            "overflow": 0,
+            "underflow": 0,
+            "nan_count": 0,
+            "bin_values": [10, 20, 30],
+        }
+    }
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        output_dir = Path(tempdir)
+        dataset_path = output_dir / "sample_dataset"
+        dataset_path.mkdir(parents=True)
+
+        # Save mock histogram to dataset -- npz this time, not pickle
+        histo_file = dataset_path / "00000-00001/histos/0.npz"
+        histo_file.parent.mkdir(parents=True)
+        save_job_histos(histo_file, sample_histograms)
+
+        # Run
+        _main(
+            args=argparse.Namespace(
+                path=dataset_path,
+                sample_percentage=1.0,  # sample everything
+                dest_dir=output_dir,
+                force=False,
+            )
+        )
+
+        # Check output HDF5 file
+        hdf5_file = output_dir / "sample_dataset.histo.hdf5"
+        assert hdf5_file.exists()
+        with h5py.File(hdf5_file, "r") as f:
+            assert "PrimaryEnergy" in f
+            assert list(f["PrimaryEnergy/bin_values"][:]) == [10, 20, 30]
+
 
 def test_310__aggregate_histograms_with_force():
     """Test aggregation with force flag to overwrite existing HDF5 output."""